@@ -1,15 +1,22 @@
 
 from solders.transaction import VersionedTransaction
 from solders.keypair import Keypair
+from solders.pubkey import Pubkey
 from solders.message import Message
 from solana.rpc.api import Client
+from spl.token.instructions import get_associated_token_address
 import base58
-import requests
-import json
 import base64
-import time
+from decimal import Decimal, InvalidOperation, localcontext
+import asyncio
+import functools
+import itertools
 import aiohttp
+import orjson
 import logging
+import random
+import sys
+import threading
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -17,182 +24,648 @@ logger = logging.getLogger(__name__)
 
 HELIUS_URL = "https://mainnet.helius-rpc.com/?api-key=2ea68573-e4c1-48ec-a2bd-7baa385c7698"
 SOL_ADDRESS = "So11111111111111111111111111111111111111112"
+JSON_HEADERS = {"Content-Type": "application/json"}
+LAMPORTS_PER_SOL = 1_000_000_000
+SOL_DECIMALS = 9
+MIN_FEE_SOL = Decimal("0.002")
+POW10 = [10 ** i for i in range(19)]
 
-def get_sol_balance(public_key: str) -> float:
+# RPC endpoints that sendTransaction is raced against alongside Jupiter
+SEND_RPC_URLS = [HELIUS_URL, "https://api.mainnet-beta.solana.com"]
+
+HELIUS_WS_URL = HELIUS_URL.replace("https://", "wss://", 1)
+BLOCKHASH_EXPIRY_SECONDS = 60
+POLL_INTERVALS = [0.25, 0.5, 1, 1, 2, 2, 4]
+POLL_MAX_WAIT = 30
+BLOCK_HEIGHT_CHECK_EVERY = 2
+BLOCK_HEIGHT_POLL_SECONDS = 2
+SECONDS_PER_BLOCK = 0.4
+
+# Upper bound on confirmation waits when lastValidBlockHeight ends them early
+EXPIRY_BOUNDED_MAX_WAIT = 120
+
+# Retry policy for transient HTTP failures and rate limiting
+RETRY_ATTEMPTS = 4
+RETRY_BASE_DELAY = 0.25
+RETRY_MAX_DELAY = 2
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_LOW_WATER = 5
+
+SOL_BALANCE_REFRESH_SECONDS = 30
+
+# Shared HTTP session so every RPC/Jupiter call reuses keepalive connections
+SESSION: aiohttp.ClientSession | None = None
+_throttle_until = 0.0
+
+# Shared websocket for signature subscriptions, multiplexed across trades
+WEBSOCKET: aiohttp.ClientWebSocketResponse | None = None
+_websocket_lock = asyncio.Lock()
+_websocket_ids = itertools.count(1)
+_pending_subscribes: dict[int, asyncio.Future] = {}
+_signature_subscriptions: dict[int, asyncio.Future] = {}
+
+# SOL balances kept fresh in the background, keyed by wallet
+_sol_balances: dict[str, Decimal] = {}
+# Bumped whenever a wallet's cached balance is invalidated, so older refreshes are discarded
+_sol_balance_versions: dict[str, int] = {}
+
+# Lines read from stdin by a daemon thread, so shutdown never waits on a blocked read
+_stdin_lines: asyncio.Queue | None = None
+
+# Strong references so fire-and-forget tasks are not garbage collected
+_background_tasks: set[asyncio.Task] = set()
+
+# Token accounts found by RPC discovery, keyed by (owner, mint)
+_token_accounts: dict[tuple[str, str], str] = {}
+
+async def get_session() -> aiohttp.ClientSession:
+    """Get the shared HTTP session, creating it on first use"""
+    global SESSION
+    if SESSION is None or SESSION.closed:
+        SESSION = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=32, ttl_dns_cache=300, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=15)
+        )
+    return SESSION
+
+async def _request(method: str, url: str, **kwargs) -> aiohttp.ClientResponse:
+    """Send an HTTP request on the shared session, retrying transient failures"""
+    global _throttle_until
+    session = await get_session()
+    loop = asyncio.get_running_loop()
+    endpoint = url.split("?", 1)[0]  # Keep API keys out of the logs
+
+    for attempt in range(RETRY_ATTEMPTS):
+        delay = RETRY_BASE_DELAY * 2 ** attempt + random.random() * 0.1
+
+        # Back off pre-emptively if the provider said we are close to its rate limit
+        if _throttle_until > loop.time():
+            await asyncio.sleep(_throttle_until - loop.time())
+
+        try:
+            # Read the body up front so callers can use it after the connection is released
+            async with session.request(method, url, **kwargs) as response:
+                await response.read()
+
+            remaining = response.headers.get("X-RateLimit-Remaining")
+            if remaining is not None and remaining.isdigit() and int(remaining) < RATE_LIMIT_LOW_WATER:
+                _throttle_until = loop.time() + delay
+
+            if response.status not in RETRY_STATUSES or attempt == RETRY_ATTEMPTS - 1:
+                return response
+
+            retry_after = response.headers.get("Retry-After")
+            if retry_after is not None and retry_after.isdigit():
+                # Honour the provider's hint, but never stall a live trade for long
+                delay = min(float(retry_after), RETRY_MAX_DELAY)
+            logger.warning(f"{method} {endpoint} returned {response.status}, retrying in {delay:.2f}s")
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if attempt == RETRY_ATTEMPTS - 1:
+                raise
+            logger.warning(f"{method} {endpoint} failed: {str(e)}, retrying in {delay:.2f}s")
+
+        await asyncio.sleep(delay)
+
+def spawn(coro) -> asyncio.Task:
+    """Run a coroutine in the background, keeping a reference until it finishes"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+def _read_stdin(loop: asyncio.AbstractEventLoop, lines: asyncio.Queue):
+    """Feed stdin lines to the event loop until EOF or the loop closes"""
+    while True:
+        line = sys.stdin.readline()
+        try:
+            loop.call_soon_threadsafe(lines.put_nowait, line)
+        except RuntimeError:
+            return  # Event loop already closed
+        if not line:
+            return
+
+async def ainput(prompt: str) -> str:
+    """Read a line from stdin without blocking the event loop"""
+    global _stdin_lines
+    if _stdin_lines is None:
+        _stdin_lines = asyncio.Queue()
+        threading.Thread(target=_read_stdin, args=(asyncio.get_running_loop(), _stdin_lines), daemon=True).start()
+
+    print(prompt, end="", flush=True)
+    line = await _stdin_lines.get()
+    if not line:
+        raise EOFError
+    return line.rstrip("\n")
+
+async def _touch(method: str, url: str, **kwargs):
+    """Send a throwaway request so the connector keeps a warm socket to the host"""
+    session = await get_session()
+    async with session.request(method, url, timeout=aiohttp.ClientTimeout(total=5), **kwargs):
+        pass
+
+async def warm_up_connections():
+    """Resolve DNS and open TLS connections to Jupiter and the RPCs before the first trade"""
+    health_check = orjson.dumps({"jsonrpc": "2.0", "id": 1, "method": "getHealth"})
+    results = await asyncio.gather(
+        _touch("HEAD", "https://quote-api.jup.ag/v6/"),
+        _touch("HEAD", "https://worker.jup.ag/"),
+        *(_touch("POST", rpc_url, data=health_check, headers=JSON_HEADERS) for rpc_url in SEND_RPC_URLS),
+        get_websocket(),
+        return_exceptions=True
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            logger.debug(f"Connection warm-up failed: {str(result)}")
+
+async def get_sol_balance(public_key: str) -> Decimal:
     """Get SOL balance for a wallet"""
     try:
-        response = requests.post(
+        response = await _request(
+            "POST",
             HELIUS_URL,
-            json={
+            data=orjson.dumps({
                 "jsonrpc": "2.0",
                 "id": 1,
                 "method": "getBalance",
-                "params": [public_key]
-            }
+                "params": [public_key, {"commitment": "confirmed"}]
+            }),
+            headers=JSON_HEADERS
         )
-        
-        if response.status_code == 200:
-            result = response.json()
+        if response.status == 200:
+            result = orjson.loads(await response.read())
             if "result" in result:
-                return float(result["result"]["value"]) / 1e9
+                return Decimal(result["result"]["value"]) / LAMPORTS_PER_SOL
     except Exception as e:
         logger.error(f"Failed to get SOL balance: {str(e)}")
-    
-    return 0
 
-def wait_for_transaction_confirmation(signature: str, max_retries: int = 30) -> bool:
-    """Wait for transaction confirmation and verify success"""
-    for _ in range(max_retries):
+    return Decimal(0)
+
+def invalidate_sol_balance(public_key: str):
+    """Drop the cached SOL balance for a wallet, including any refresh already in flight"""
+    _sol_balances.pop(public_key, None)
+    _sol_balance_versions[public_key] = _sol_balance_versions.get(public_key, 0) + 1
+
+async def refresh_sol_balance(public_key: str):
+    """Refresh the cached SOL balance for a wallet"""
+    version = _sol_balance_versions.get(public_key, 0)
+    try:
+        (data,) = await rpc_batch([("getBalance", [public_key, {"commitment": "confirmed"}])])
+        # A trade submitted meanwhile makes this reading stale
+        if "result" in data and _sol_balance_versions.get(public_key, 0) == version:
+            _sol_balances[public_key] = Decimal(data["result"]["value"]) / LAMPORTS_PER_SOL
+    except Exception as e:
+        logger.warning(f"Failed to refresh SOL balance: {str(e)}")
+
+async def refresh_sol_balance_loop(public_key: str):
+    """Keep the cached SOL balance for a wallet fresh"""
+    while True:
+        await refresh_sol_balance(public_key)
+        await asyncio.sleep(SOL_BALANCE_REFRESH_SECONDS)
+
+async def get_block_height() -> int:
+    """Get the current block height"""
+    response = await _request(
+        "POST",
+        HELIUS_URL,
+        data=orjson.dumps({
+            "jsonrpc": "2.0",
+            "id": 1,
+            "method": "getBlockHeight",
+            "params": [{"commitment": "confirmed"}]
+        }),
+        headers=JSON_HEADERS
+    )
+    return orjson.loads(await response.read())["result"]
+
+async def wait_for_block_height(block_height: int):
+    """Return once the chain has moved past the given block height"""
+    first_check = True
+    while True:
+        delay = BLOCK_HEIGHT_POLL_SECONDS
         try:
-            response = requests.post(
-                HELIUS_URL,
-                json={
-                    "jsonrpc": "2.0",
-                    "id": 1,
-                    "method": "getTransaction",
-                    "params": [
-                        signature,
-                        {"maxSupportedTransactionVersion": 0}
-                    ]
-                }
+            current_height = await get_block_height()
+            if current_height > block_height:
+                return
+
+            # Sleep through most of the remaining blocks instead of polling all the way there
+            if first_check:
+                delay = max(delay, (block_height - current_height) * SECONDS_PER_BLOCK)
+        except Exception as e:
+            logger.warning(f"Error checking block height: {str(e)}")
+
+        first_check = False
+        await asyncio.sleep(delay)
+
+async def get_signature_status(signature: str, include_block_height: bool = False) -> tuple[dict | None, int | None]:
+    """Get a signature's status and optionally the block height in one round trip"""
+    calls = [("getSignatureStatuses", [[signature], {"searchTransactionHistory": False}])]
+    if include_block_height:
+        calls.append(("getBlockHeight", [{"commitment": "confirmed"}]))
+
+    results = await rpc_batch(calls)
+    status = results[0]["result"]["value"][0]
+    block_height = results[1]["result"] if include_block_height else None
+    return status, block_height
+
+def is_confirmed(status: dict | None) -> bool:
+    """Check whether a signature status has reached confirmed commitment"""
+    return status is not None and status.get("confirmationStatus") in ("confirmed", "finalized")
+
+async def poll_transaction_confirmation(signature: str, last_valid_block_height: int | None = None, max_wait: float | None = None) -> bool:
+    """Poll over HTTP for transaction confirmation and verify success"""
+    if max_wait is None:
+        max_wait = POLL_MAX_WAIT if last_valid_block_height is None else EXPIRY_BOUNDED_MAX_WAIT
+
+    # Measure against the clock, since each poll can itself spend time retrying
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_wait
+    attempt = 0
+    while loop.time() < deadline:
+        try:
+            # Every few polls, fetch the block height alongside the status
+            check_expiry = last_valid_block_height is not None and attempt % BLOCK_HEIGHT_CHECK_EVERY == BLOCK_HEIGHT_CHECK_EVERY - 1
+            status, block_height = await asyncio.wait_for(
+                get_signature_status(signature, include_block_height=check_expiry),
+                timeout=deadline - loop.time()
             )
-            
-            if response.status_code == 200:
-                result = response.json().get("result")
-                if result:
-                    if result.get("meta", {}).get("err") is None:
-                        return True
-                    else:
-                        logger.error(f"Transaction failed: {result['meta']['err']}")
-                        return False
-                        
+
+            if status:
+                if status.get("err") is not None:
+                    logger.error(f"Transaction failed: {status['err']}")
+                    return False
+                if is_confirmed(status):
+                    return True
+
+            # Give up once the blockhash can no longer land
+            if block_height is not None and block_height > last_valid_block_height:
+                logger.error("Transaction expired: blockhash is no longer valid")
+                return False
+
         except Exception as e:
             logger.warning(f"Error checking transaction status: {str(e)}")
-            
-        time.sleep(1)
-    
+
+        interval = POLL_INTERVALS[min(attempt, len(POLL_INTERVALS) - 1)]
+        await asyncio.sleep(max(0, min(interval, deadline - loop.time())))
+        attempt += 1
+
     return False
 
-def get_quote(input_mint: str, output_mint: str, amount: str) -> dict:
+async def get_websocket() -> aiohttp.ClientWebSocketResponse:
+    """Get the shared RPC websocket, connecting on first use"""
+    global WEBSOCKET
+    async with _websocket_lock:
+        if WEBSOCKET is None or WEBSOCKET.closed:
+            session = await get_session()
+            WEBSOCKET = await session.ws_connect(HELIUS_WS_URL, heartbeat=30)
+            spawn(_read_websocket(WEBSOCKET))
+    return WEBSOCKET
+
+def _dispatch_websocket_message(data: dict):
+    """Route a subscribe reply or signature notification to its waiting trade"""
+    if "id" in data:
+        # Reply to a subscribe request; register before any notification arrives
+        future = _pending_subscribes.pop(data["id"], None)
+        if future is None or future.done():
+            return
+        if "result" not in data:
+            future.set_exception(Exception(f"Subscribe failed: {data.get('error', data)}"))
+        else:
+            _signature_subscriptions[data["result"]] = future
+    elif data.get("method") == "signatureNotification":
+        params = data["params"]
+        future = _signature_subscriptions.pop(params["subscription"], None)
+        if future is not None and not future.done():
+            future.set_result(params["result"])
+
+async def _read_websocket(ws: aiohttp.ClientWebSocketResponse):
+    """Dispatch subscription replies and notifications to waiting trades"""
+    try:
+        async for msg in ws:
+            if msg.type != aiohttp.WSMsgType.TEXT:
+                continue
+
+            # A malformed frame is skipped rather than stopping the reader
+            try:
+                _dispatch_websocket_message(orjson.loads(msg.data))
+            except Exception as e:
+                logger.warning(f"Ignoring bad WebSocket message: {str(e)}")
+    except Exception as e:
+        logger.warning(f"WebSocket reader stopped: {str(e)}")
+    finally:
+        # Wake any waiters so they can fall back to HTTP polling
+        for future in [*_pending_subscribes.values(), *_signature_subscriptions.values()]:
+            if not future.done():
+                future.set_exception(Exception("WebSocket closed"))
+        _pending_subscribes.clear()
+        _signature_subscriptions.clear()
+
+        # Nothing reads this socket anymore, so close it and let get_websocket reconnect
+        if not ws.closed:
+            await ws.close()
+
+async def close_websocket():
+    """Close the shared RPC websocket if it is open"""
+    if WEBSOCKET is not None and not WEBSOCKET.closed:
+        await WEBSOCKET.close()
+
+async def check_final_status(signature: str) -> bool:
+    """Check a signature once after its confirmation wait ran out"""
+    try:
+        status, _ = await get_signature_status(signature)
+    except Exception as e:
+        logger.warning(f"Error checking transaction status: {str(e)}")
+        return False
+
+    if status and status.get("err") is not None:
+        logger.error(f"Transaction failed: {status['err']}")
+        return False
+
+    return is_confirmed(status)
+
+async def wait_for_transaction_confirmation(signature: str, last_valid_block_height: int | None = None, timeout: float | None = None) -> bool:
+    """Wait for transaction confirmation via signatureSubscribe and verify success"""
+    if timeout is None:
+        timeout = BLOCKHASH_EXPIRY_SECONDS if last_valid_block_height is None else EXPIRY_BOUNDED_MAX_WAIT
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    future = loop.create_future()
+    request_id = next(_websocket_ids)
+    try:
+        ws = await get_websocket()
+        _pending_subscribes[request_id] = future
+        await ws.send_str(orjson.dumps({
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "method": "signatureSubscribe",
+            "params": [
+                signature,
+                {"commitment": "confirmed"}
+            ]
+        }).decode())
+    except Exception as e:
+        _pending_subscribes.pop(request_id, None)
+        logger.warning(f"WebSocket subscribe failed, falling back to polling: {str(e)}")
+        return await poll_transaction_confirmation(signature, last_valid_block_height)
+
+    # Stop waiting as soon as the blockhash expires rather than only on the timeout
+    expiry = spawn(wait_for_block_height(last_valid_block_height)) if last_valid_block_height is not None else None
+    fall_back = False
+    try:
+        waiters = {future} if expiry is None else {future, expiry}
+        done, _ = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        result = future.result() if future in done else None
+    except Exception as e:
+        logger.warning(f"WebSocket subscription failed, falling back to polling: {str(e)}")
+        fall_back = True
+    finally:
+        if expiry is not None:
+            expiry.cancel()
+        _pending_subscribes.pop(request_id, None)
+        for subscription, pending in list(_signature_subscriptions.items()):
+            if pending is future:
+                del _signature_subscriptions[subscription]
+
+    # Poll only once the expiry watcher is gone, and only for the time left
+    if fall_back:
+        return await poll_transaction_confirmation(signature, last_valid_block_height, max(0, deadline - loop.time()))
+
+    if result is None:
+        if expiry is not None and expiry.done() and not expiry.cancelled():
+            logger.error("Transaction expired: blockhash is no longer valid")
+
+        # One last look in case the notification was missed or it landed just before the deadline
+        return await check_final_status(signature)
+
+    err = result["value"]["err"]
+    if err is not None:
+        logger.error(f"Transaction failed: {err}")
+        return False
+
+    return True
+
+async def get_quote(input_mint: str, output_mint: str, amount: str) -> dict:
     """Get optimized quote from Jupiter"""
     try:
         quote_url = f"https://quote-api.jup.ag/v6/quote?inputMint={input_mint}&outputMint={output_mint}&amount={amount}&restrictIntermediateTokens=true"
-        response = requests.get(quote_url)
+        response = await _request("GET", quote_url)
         response.raise_for_status()
-        return response.json()
+        return orjson.loads(await response.read())
     except Exception as e:
         logger.error(f"Quote failed: {str(e)}")
         raise
 
+async def rpc_batch(calls: list[tuple[str, list]]) -> list[dict]:
+    """Send several JSON-RPC calls in a single HTTP request"""
+    response = await _request(
+        "POST",
+        HELIUS_URL,
+        data=orjson.dumps([
+            {
+                "jsonrpc": "2.0",
+                "id": i,
+                "method": method,
+                "params": params
+            }
+            for i, (method, params) in enumerate(calls)
+        ]),
+        headers=JSON_HEADERS
+    )
+    if response.status != 200:
+        raise Exception(f"RPC batch failed: {await response.text()}")
+
+    results = orjson.loads(await response.read())
+
+    # Batch-level errors (rate limits, batches not allowed) come back as a single object
+    if not isinstance(results, list) or len(results) != len(calls):
+        raise Exception(f"RPC batch failed: {results}")
+
+    return sorted(results, key=lambda result: result["id"])
+
+@functools.lru_cache(maxsize=512)
+def get_associated_token_account(owner_public_key: str, mint: str) -> str:
+    """Derive the owner's associated token account for a mint locally"""
+    return str(get_associated_token_address(Pubkey.from_string(owner_public_key), Pubkey.from_string(mint)))
+
+async def find_token_account(owner_public_key: str, mint: str) -> tuple[str, dict] | None:
+    """Look up the owner's token account and balance for a mint through the RPC"""
+    (data,) = await rpc_batch([
+        ("getTokenAccountsByOwner", [
+            owner_public_key,
+            {"mint": mint},
+            {"encoding": "jsonParsed"}
+        ])
+    ])
+    if "result" not in data or not data["result"]["value"]:
+        return None
+
+    account = data["result"]["value"][0]
+    return account["pubkey"], account["account"]["data"]["parsed"]["info"]["tokenAmount"]
+
+# Static swap settings, built once and shared by every swap request
+_SWAP_TEMPLATE = {
+    "wrapUnwrapSOL": True,
+    "useVersionedTransaction": True,
+    "dynamicComputeUnitLimit": True,
+    "dynamicSlippage": {
+        "maxBps": 300
+    },
+    "prioritizationFeeLamports": {
+        "priorityLevelWithMaxLamports": {
+            "maxLamports": 10000000,
+            "priorityLevel": "veryHigh",
+            "global": False
+        }
+    }
+}
+
 def create_swap_data(quote_response: dict, sender_public_key: str) -> dict:
     """Create optimized swap data according to Jupiter's recommendations"""
     return {
         "quoteResponse": quote_response,
         "userPublicKey": sender_public_key,
-        "wrapUnwrapSOL": True,
-        "useVersionedTransaction": True,
-        "dynamicComputeUnitLimit": True,
-        "dynamicSlippage": {
-            "maxBps": 300
-        },
-        "prioritizationFeeLamports": {
-            "priorityLevelWithMaxLamports": {
-                "maxLamports": 10000000,
-                "priorityLevel": "veryHigh",
-                "global": False
+        **_SWAP_TEMPLATE
+    }
+
+async def get_swap_transaction(swap_data: dict) -> dict:
+    """Get the swap transaction response from Jupiter"""
+    swap_response = await _request(
+        "POST",
+        "https://quote-api.jup.ag/v6/swap",
+        data=orjson.dumps(swap_data),
+        headers=JSON_HEADERS
+    )
+    if swap_response.status != 200:
+        raise Exception(f"Swap transaction failed: {await swap_response.text()}")
+
+    return orjson.loads(await swap_response.read())
+
+def sign_transaction(swap_transaction: str, sender_keypair: Keypair) -> str:
+    """Sign Jupiter's serialized swap transaction and return it base64 encoded"""
+    unsigned_tx = VersionedTransaction.from_bytes(base64.b64decode(swap_transaction))
+
+    # Each .message access builds a new object, so materialize it once
+    message = unsigned_tx.message
+    signature = sender_keypair.sign_message(bytes(message))
+    signed_tx = VersionedTransaction.populate(message, [signature])
+    return base64.b64encode(bytes(signed_tx)).decode("ascii")
+
+async def send_via_jupiter(encoded_tx: str) -> str:
+    """Send transaction through Jupiter's send endpoint"""
+    send_response = await _request(
+        "POST",
+        "https://worker.jup.ag/send-transaction",
+        data=orjson.dumps({"transaction": encoded_tx}),
+        headers=JSON_HEADERS
+    )
+    if send_response.status != 200:
+        raise Exception(f"Jupiter send failed: {await send_response.text()}")
+
+    txid = orjson.loads(await send_response.read()).get("txid")
+
+    if not txid:
+        raise Exception("Jupiter send returned no txid")
+
+    return txid
+
+async def send_via_rpc(rpc_url: str, encoded_tx: str) -> str:
+    """Send transaction through a JSON-RPC sendTransaction call"""
+    rpc_request = {
+        "jsonrpc": "2.0",
+        "id": 1,
+        "method": "sendTransaction",
+        "params": [
+            encoded_tx,
+            {
+                "encoding": "base64",
+                "skipPreflight": True,
+                "maxRetries": 3
             }
-        }
+        ]
     }
 
-def send_transaction(encoded_tx: str) -> str:
-    """Send transaction with fallback"""
+    response = await _request(
+        "POST",
+        rpc_url,
+        data=orjson.dumps(rpc_request),
+        headers=JSON_HEADERS
+    )
+    if response.status != 200:
+        raise Exception(f"Send failed: {await response.text()}")
+
+    result = orjson.loads(await response.read())
+
+    if "error" in result:
+        raise Exception(f"Send failed: {result}")
+
+    return result["result"]
+
+async def send_transaction(encoded_tx: str) -> str:
+    """Broadcast transaction to every send endpoint and return the first signature"""
+    # The transaction is already signed, so every endpoint yields the same signature
+    tasks = [asyncio.create_task(send_via_jupiter(encoded_tx))]
+    tasks += [asyncio.create_task(send_via_rpc(rpc_url, encoded_tx)) for rpc_url in SEND_RPC_URLS]
+
+    errors = []
     try:
-        # Try Jupiter endpoint first
-        send_response = requests.post(
-            "https://worker.jup.ag/send-transaction",
-            json={"transaction": encoded_tx},
-            headers={"Content-Type": "application/json"}
-        )
-        
-        if send_response.status_code == 200:
-            return send_response.json().get("txid")
-            
-        # Fallback to Helius
-        rpc_request = {
-            "jsonrpc": "2.0",
-            "id": 1,
-            "method": "sendTransaction",
-            "params": [
-                encoded_tx,
-                {
-                    "encoding": "base64",
-                    "skipPreflight": True,
-                    "maxRetries": 3
-                }
-            ]
-        }
-        
-        response = requests.post(
-            HELIUS_URL,
-            json=rpc_request,
-            headers={"Content-Type": "application/json"}
-        )
-        
-        if response.status_code != 200:
-            raise Exception(f"Send failed: {response.text}")
-            
-        result = response.json()
-        if "error" in result:
-            raise Exception(f"Send failed: {result}")
-            
-        return result["result"]
-        
-    except Exception as e:
-        logger.error(f"Failed to send transaction: {str(e)}")
-        raise
+        for next_result in asyncio.as_completed(tasks):
+            try:
+                return await next_result
+            except Exception as e:
+                errors.append(str(e))
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    logger.error(f"Failed to send transaction: {errors}")
+    raise Exception(f"Send failed on all endpoints: {errors}")
+
+def pow10(exponent: int) -> int:
+    """Get a power of ten, using the precomputed table when it covers the exponent"""
+    return POW10[exponent] if exponent < len(POW10) else 10 ** exponent
 
-def buy_tokens(contract_address: str, amount: float, private_key: str):
+def to_smallest_unit(amount: Decimal, decimals: int) -> int:
+    """Convert a token amount to its smallest unit without precision loss"""
+    with localcontext() as ctx:
+        ctx.prec = max(ctx.prec, len(amount.as_tuple().digits) + decimals)
+        return int(amount * pow10(decimals))
+
+def from_smallest_unit(raw_amount: int, decimals: int) -> Decimal:
+    """Convert an amount in a token's smallest unit back to tokens without precision loss"""
+    with localcontext() as ctx:
+        ctx.prec = max(ctx.prec, len(str(abs(raw_amount))))
+        return Decimal(raw_amount) / pow10(decimals)
+
+async def buy_tokens(contract_address: str, amount: Decimal, sender_keypair: Keypair, sender_public_key: str):
     try:
-        # Initial setup
-        private_key_bytes = base58.b58decode(private_key)
-        sender_keypair = Keypair.from_bytes(private_key_bytes)
-        sender_public_key = str(sender_keypair.pubkey())
-        
-        # Check balance
-        sol_balance = get_sol_balance(sender_public_key)
+        # Get quote while checking balance, using the background-refreshed balance when available
+        amount_in_lamports = str(to_smallest_unit(amount, SOL_DECIMALS))
+        quote_task = asyncio.create_task(get_quote(SOL_ADDRESS, contract_address, amount_in_lamports))
+        sol_balance = _sol_balances.get(sender_public_key)
+        if sol_balance is None:
+            sol_balance = await get_sol_balance(sender_public_key)
+        quote_response = await quote_task
+
         if sol_balance < amount:
             raise Exception(f"Insufficient SOL balance. You have {sol_balance} SOL but trying to spend {amount} SOL")
-        
-        # Get quote
-        amount_in_lamports = str(int(amount * (10 ** 9)))
-        quote_response = get_quote(SOL_ADDRESS, contract_address, amount_in_lamports)
-        
+
         # Create swap data
         swap_data = create_swap_data(quote_response, sender_public_key)
-        
+
         # Get swap transaction
-        swap_response = requests.post(
-            "https://quote-api.jup.ag/v6/swap",
-            json=swap_data
-        )
-        
-        if swap_response.status_code != 200:
-            raise Exception(f"Swap transaction failed: {swap_response.text}")
-            
+        swap_response = await get_swap_transaction(swap_data)
+
         # Sign transaction
-        swap_instruction = swap_response.json()["swapTransaction"]
-        unsigned_tx = VersionedTransaction.from_bytes(base64.b64decode(swap_instruction))
-        
-        signature = sender_keypair.sign_message(bytes(unsigned_tx.message))
-        signed_tx = VersionedTransaction.populate(unsigned_tx.message, [signature])
-        encoded_tx = base64.b64encode(bytes(signed_tx)).decode()
-        
-        # Send transaction
-        tx_signature = send_transaction(encoded_tx)
+        encoded_tx = sign_transaction(swap_response["swapTransaction"], sender_keypair)
+
+        # Send transaction; the cached SOL balance is stale from here on
+        invalidate_sol_balance(sender_public_key)
+        tx_signature = await send_transaction(encoded_tx)
         print(f"Transaction submitted. Waiting for confirmation...")
-        
+
         # Wait for confirmation
-        if wait_for_transaction_confirmation(tx_signature):
+        if await wait_for_transaction_confirmation(tx_signature, swap_response.get("lastValidBlockHeight")):
             print(f"Transaction confirmed! View details: https://solscan.io/tx/{tx_signature}")
             return tx_signature
         else:
@@ -203,99 +676,86 @@ def buy_tokens(contract_address: str, amount: float, private_key: str):
         print(f"Error: {str(e)}")
         return None
 
-def sell_tokens(contract_address: str, amount: float, private_key: str):
+async def sell_tokens(contract_address: str, amount: Decimal, sender_keypair: Keypair, sender_public_key: str):
     try:
-        # Get token account and balance
-        private_key_bytes = base58.b58decode(private_key)
-        sender_keypair = Keypair.from_bytes(private_key_bytes)
-        sender_public_key = str(sender_keypair.pubkey())
-        
-        response = requests.post(
-            HELIUS_URL,
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "getTokenAccountsByOwner",
-                "params": [
-                    sender_public_key,
-                    {"mint": contract_address},
-                    {"encoding": "jsonParsed"}
-                ]
-            }
-        )
-        
-        data = response.json()
-        if "result" not in data or not data["result"]["value"]:
-            raise Exception("No token account found")
-            
-        token_account = data["result"]["value"][0]["pubkey"]
-        token_decimals = data["result"]["value"][0]["account"]["data"]["parsed"]["info"]["tokenAmount"]["decimals"]
-        current_balance = float(data["result"]["value"][0]["account"]["data"]["parsed"]["info"]["tokenAmount"]["amount"]) / (10 ** token_decimals)
-        
-        if amount == 0 or amount > current_balance:
-            amount = current_balance
-            
-        if amount <= 0:
+        # Use a previously discovered account, otherwise the derived associated account
+        account_key = (sender_public_key, contract_address)
+        token_account = _token_accounts.get(account_key) or get_associated_token_account(sender_public_key, contract_address)
+
+        # Fetch token balance and SOL balance in one round trip
+        data, balance_data = await rpc_batch([
+            ("getTokenAccountBalance", [token_account]),
+            ("getBalance", [sender_public_key, {"commitment": "confirmed"}])
+        ])
+        sol_balance = Decimal(balance_data["result"]["value"]) / LAMPORTS_PER_SOL if "result" in balance_data else Decimal(0)
+
+        if "result" in data:
+            token_amount = data["result"]["value"]
+        else:
+            # Not a standard associated account (e.g. Token-2022), so discover it
+            found = await find_token_account(sender_public_key, contract_address)
+            if found is None:
+                raise Exception("No token account found")
+            token_account, token_amount = found
+            _token_accounts[account_key] = token_account
+
+        token_decimals = token_amount["decimals"]
+        raw_balance = int(token_amount["amount"])
+        current_balance = from_smallest_unit(raw_balance, token_decimals)
+
+        # Work in the token's smallest unit so large balances stay exact
+        amount_in_smallest_unit = to_smallest_unit(amount, token_decimals)
+        if amount == 0 or amount_in_smallest_unit > raw_balance:
+            amount_in_smallest_unit = raw_balance
+
+        if amount_in_smallest_unit <= 0:
             raise Exception("No tokens to sell")
-            
-        print(f"Selling {amount} tokens...")
-        
+
+        print(f"Selling {from_smallest_unit(amount_in_smallest_unit, token_decimals)} tokens...")
+
         # Check if there's enough SOL for transaction fees
-        sol_balance = get_sol_balance(sender_public_key)
-        if sol_balance < 0.002:  # Minimum SOL for fees
+        if sol_balance < MIN_FEE_SOL:  # Minimum SOL for fees
             raise Exception(f"Insufficient SOL balance for transaction fees. You have {sol_balance} SOL")
-        
+
         # Get quote
-        amount_in_smallest_unit = str(int(amount * (10 ** token_decimals)))
-        quote_response = get_quote(contract_address, SOL_ADDRESS, amount_in_smallest_unit)
-        
+        quote_response = await get_quote(contract_address, SOL_ADDRESS, str(amount_in_smallest_unit))
+
         # Create swap data
         swap_data = create_swap_data(quote_response, sender_public_key)
-        
+
         # Get swap transaction
-        swap_response = requests.post(
-            "https://quote-api.jup.ag/v6/swap",
-            json=swap_data
-        )
-        
-        if swap_response.status_code != 200:
-            raise Exception(f"Swap transaction failed: {swap_response.text}")
-            
+        swap_response = await get_swap_transaction(swap_data)
+
         # Sign transaction
-        swap_instruction = swap_response.json()["swapTransaction"]
-        unsigned_tx = VersionedTransaction.from_bytes(base64.b64decode(swap_instruction))
-        
-        signature = sender_keypair.sign_message(bytes(unsigned_tx.message))
-        signed_tx = VersionedTransaction.populate(unsigned_tx.message, [signature])
-        encoded_tx = base64.b64encode(bytes(signed_tx)).decode()
-        
-        # Send transaction
-        tx_signature = send_transaction(encoded_tx)
+        encoded_tx = sign_transaction(swap_response["swapTransaction"], sender_keypair)
+
+        # Send transaction; the cached SOL balance is stale from here on
+        invalidate_sol_balance(sender_public_key)
+        tx_signature = await send_transaction(encoded_tx)
         print(f"Transaction submitted. Waiting for confirmation...")
-        
+
         # Wait for confirmation
-        if wait_for_transaction_confirmation(tx_signature):
+        if await wait_for_transaction_confirmation(tx_signature, swap_response.get("lastValidBlockHeight")):
             print(f"Transaction confirmed! View details: https://solscan.io/tx/{tx_signature}")
-            
-            # Verify balance change
-            time.sleep(2)
-            verify_response = requests.post(
-                HELIUS_URL,
-                json={
-                    "jsonrpc": "2.0",
-                    "id": 1,
-                    "method": "getTokenAccountBalance",
-                    "params": [token_account]
-                }
-            )
-            
-            if "result" in verify_response.json():
-                new_balance = float(verify_response.json()["result"]["value"]["amount"]) / (10 ** token_decimals)
-                if new_balance < current_balance:
-                    print(f"Balance reduced from {current_balance} to {new_balance}")
+
+            # Verify status and balance change
+            await asyncio.sleep(2)
+            status_data, verify_data = await rpc_batch([
+                ("getSignatureStatuses", [[tx_signature]]),
+                ("getTokenAccountBalance", [token_account])
+            ])
+
+            status = status_data.get("result", {}).get("value", [None])[0]
+            if status and status.get("err") is not None:
+                print(f"Warning: Transaction reported an error: {status['err']}")
+
+            if "result" in verify_data:
+                new_raw_balance = int(verify_data["result"]["value"]["amount"])
+                if new_raw_balance < raw_balance:
+                    print(f"Balance reduced from {current_balance} to {from_smallest_unit(new_raw_balance, token_decimals)}")
                 else:
                     print("Warning: Token balance did not decrease as expected")
-            
+
             return tx_signature
         else:
             print("Transaction failed or timed out!")
@@ -305,46 +765,71 @@ def sell_tokens(contract_address: str, amount: float, private_key: str):
         print(f"Error: {str(e)}")
         return None
 
-def main():
+async def run():
     print("Welcome to Solana Token Trader!")
-    private_key = input("Enter your private key: ")
-    
+    private_key = await ainput("Enter your private key: ")
+
+    # Decode the keypair once instead of on every trade
+    try:
+        sender_keypair = Keypair.from_bytes(base58.b58decode(private_key))
+    except Exception as e:
+        print(f"Invalid private key: {str(e)}")
+        return
+    sender_public_key = str(sender_keypair.pubkey())
+
+    # Closing the shared session on exit releases the pooled connections
+    async with await get_session():
+        # Warm-up and balance refresh run while the user is typing
+        spawn(warm_up_connections())
+        refresh_task = spawn(refresh_sol_balance_loop(sender_public_key))
+        try:
+            await repl(sender_keypair, sender_public_key)
+        finally:
+            refresh_task.cancel()
+            await close_websocket()
+
+async def repl(sender_keypair: Keypair, sender_public_key: str):
     while True:
         print("\n1. Buy tokens")
-        print("2. Sell tokens") 
+        print("2. Sell tokens")
         print("3. Exit")
-        
-        choice = input("Enter choice (1-3): ")
-        
+
+        choice = await ainput("Enter choice (1-3): ")
+
         if choice == "3":
             print("Thank you for using Solana Token Trader!")
             break
-            
+
         if choice not in ["1", "2"]:
             print("Invalid choice")
             continue
-            
-        contract_address = input("Enter token contract address: ")
-        
+
+        contract_address = await ainput("Enter token contract address: ")
+
         if choice == "1":
             try:
-                amount = float(input("Enter SOL amount: "))
+                amount = Decimal(await ainput("Enter SOL amount: "))
                 print(f"\nInitiating buy of tokens for {amount} SOL...")
-                tx_sig = buy_tokens(contract_address, amount, private_key)
+                tx_sig = await buy_tokens(contract_address, amount, sender_keypair, sender_public_key)
+                spawn(refresh_sol_balance(sender_public_key))
                 if not tx_sig:
                     print("Transaction failed")
-            except ValueError:
+            except (ValueError, InvalidOperation):
                 print("Invalid amount")
         else:
             try:
-                amount_input = input("Enter token amount (or press Enter for all): ")
-                amount = float(amount_input) if amount_input else 0
+                amount_input = await ainput("Enter token amount (or press Enter for all): ")
+                amount = Decimal(amount_input) if amount_input else Decimal(0)
                 print(f"\nInitiating sell of tokens...")
-                tx_sig = sell_tokens(contract_address, amount, private_key)
+                tx_sig = await sell_tokens(contract_address, amount, sender_keypair, sender_public_key)
+                spawn(refresh_sol_balance(sender_public_key))
                 if not tx_sig:
                     print("Transaction failed")
-            except ValueError:
+            except (ValueError, InvalidOperation):
                 print("Invalid amount")
 
+def main():
+    asyncio.run(run())
+
 if __name__ == "__main__":
     main()